@@ -1,16 +1,24 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-import matplotlib.pyplot as plt
-import seaborn as sns
-import squarify
-import pdfplumber
+import fitz  # PyMuPDF
 import docx
-from fuzzywuzzy import fuzz
+from rapidfuzz import process, fuzz as rfuzz
+import ahocorasick
 import unicodedata
+import requests
 from langdetect import detect
 import os
 import io
+import re
+
+try:
+    from numba import njit
+except ImportError:  # numba é opcional; sem ele caímos no split por regex
+    njit = None
+
+_SENT_RE = re.compile(r'[.!?]')
 
 # Defina a sua senha secreta aqui
 PASSWORD = "cdshell"  # Troque por uma senha forte
@@ -32,48 +40,180 @@ if not check_password():
 
 # ---- Funções auxiliares ----
 
+@st.cache_resource
+def _fetch_xlsx(url):
+    """Baixa os bytes da planilha uma única vez por processo (pula o HTTP em reruns)."""
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
 @st.cache_data
 def load_precursors_excel(path):
-    df = pd.read_excel(path)
+    if isinstance(path, str) and path.startswith(("http://", "https://")):
+        path = io.BytesIO(_fetch_xlsx(path))
+    # Backend Arrow: colunas de texto vetorizadas em vez de objetos Python
+    df = pd.read_excel(path, dtype_backend="pyarrow")
     if not {"Dimensao", "PT", "EN"}.issubset(df.columns):
         st.error("A planilha deve conter as colunas: 'Dimensao', 'PT', 'EN'.")
         st.stop()
     return df.dropna(subset=["PT", "EN"])
 
-def extract_text_from_pdf(uploaded_file):
-    with pdfplumber.open(uploaded_file) as pdf:
-        text = " ".join(page.extract_text() for page in pdf.pages if page.extract_text())
-    return text
+def extract_text_from_pdf(file_bytes):
+    # Gerador: entrega o texto página a página, sem materializar o PDF inteiro
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    try:
+        for page in doc:
+            yield page.get_text("text")
+    finally:
+        doc.close()
+
+_DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
 
 def extract_text_from_docx(uploaded_file):
+    # Itera os elementos <w:t> direto na árvore lxml, sem construir objetos Paragraph
     doc = docx.Document(uploaded_file)
-    return " ".join([para.text for para in doc.paragraphs])
+    return " ".join(t.text for t in doc.element.body.iter(_DOCX_NS + "t") if t.text)
+
+@st.cache_data
+def _extract(file_bytes, ext):
+    """Extrai o texto (bruto e normalizado), cacheado pelo hash dos bytes do arquivo.
+
+    Para PDFs, as páginas chegam por um gerador e são normalizadas conforme são
+    extraídas, sobrepondo as duas fases e segurando só uma página por vez antes
+    do join final. Mover o slider de threshold não reprocessa o arquivo.
+    """
+    if ext == ".pdf":
+        raw_parts, norm_parts = [], []
+        for page_text in extract_text_from_pdf(file_bytes):
+            raw_parts.append(page_text)
+            norm_parts.append(normalize(page_text))
+        return " ".join(raw_parts), " ".join(norm_parts)
+    text = extract_text_from_docx(io.BytesIO(file_bytes))
+    return text, normalize(text)
+
+# Tabela de tradução que remove marcas de combinação (acentos) após NFKD,
+# preenchida sob demanda apenas para os caracteres já vistos
+class _CombiningStripper(dict):
+    def __missing__(self, codepoint):
+        keep = None if unicodedata.combining(chr(codepoint)) else codepoint
+        self[codepoint] = keep
+        return keep
+
+_COMBINING_TABLE = _CombiningStripper()
 
 def normalize(text):
-    text = unicodedata.normalize("NFKD", str(text))
-    text = "".join([c for c in text if not unicodedata.combining(c)])
-    return text.lower()
-
-def fuzzy_match_terms_count(text, precursors_df, threshold=75):
-    import re
-    normalized_text = normalize(text)
-    results = []
-    for _, row in precursors_df.iterrows():
-        for lang in ["PT", "EN"]:
-            for term in str(row[lang]).split(";"):
-                term = normalize(term.strip())
-                # Conta quantas vezes o termo ocorre de forma aproximada no texto
-                count = 0
-                for sentence in re.split(r'[.!?]', normalized_text):
-                    if fuzz.partial_ratio(term, sentence.strip()) >= threshold:
-                        count += 1
-                if count > 0:
-                    results.append({
-                        "Precursor": term,
-                        "Dimensao": row["Dimensao"],
-                        "Idioma": lang,
-                        "Frequência": count
-                    })
+    return unicodedata.normalize("NFKD", str(text)).translate(_COMBINING_TABLE).lower()
+
+if njit is not None:
+    @njit(cache=True)
+    def _split_offsets(buf):
+        # Varre o buffer de bytes e devolve os pares (início, fim) dos
+        # trechos delimitados por . ! ? (bytes ASCII, seguros em UTF-8)
+        offsets = np.empty((len(buf) + 1, 2), dtype=np.int64)
+        n = 0
+        start = 0
+        for i in range(len(buf)):
+            b = buf[i]
+            if b == 46 or b == 33 or b == 63:  # . ! ?
+                if i > start:
+                    offsets[n, 0] = start
+                    offsets[n, 1] = i
+                    n += 1
+                start = i + 1
+        if len(buf) > start:
+            offsets[n, 0] = start
+            offsets[n, 1] = len(buf)
+            n += 1
+        return offsets[:n]
+
+def _split_sentences(normalized_text):
+    """Divide o texto normalizado em sentenças (kernel JIT sobre bytes, com fallback em regex)."""
+    if njit is None:
+        return [s.strip() for s in _SENT_RE.split(normalized_text) if s.strip()]
+    raw = normalized_text.encode("utf-8")
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    sentences = []
+    for start, end in _split_offsets(buf):
+        sentence = raw[start:end].decode("utf-8").strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+@st.cache_resource
+def build_matchers(precursors_df):
+    """Pré-computa os arrays de termos (SoA) e o autômato Aho-Corasick.
+
+    Cacheado pelo conteúdo da planilha, sobrevive a reruns e sessões: o loop
+    interativo do slider só refaz a varredura do texto e o cdist.
+    """
+    terms_norm, dims, langs, terms_orig = [], [], [], []
+    for dim, pt, en in zip(precursors_df["Dimensao"], precursors_df["PT"], precursors_df["EN"]):
+        for lang, cell in (("PT", pt), ("EN", en)):
+            for term in str(cell).split(";"):
+                raw_term = term.strip()
+                terms_norm.append(normalize(raw_term))
+                dims.append(dim)
+                langs.append(lang)
+                terms_orig.append(raw_term)
+    # Deduplica pela forma normalizada: cognatos e siglas idênticos entre PT e
+    # EN são avaliados uma única vez e expandidos de volta via row_to_unique
+    unique_index = {}
+    row_to_unique = []
+    for term in terms_norm:
+        row_to_unique.append(unique_index.setdefault(term, len(unique_index)))
+    unique_terms = list(unique_index)
+    automaton = ahocorasick.Automaton()
+    for idx, term in enumerate(unique_terms):
+        if term:
+            automaton.add_word(term, idx)
+    automaton.make_automaton()
+    return (
+        automaton,
+        np.asarray(terms_norm, dtype=object),
+        np.asarray(dims, dtype=object),
+        np.asarray(langs, dtype=object),
+        np.asarray(terms_orig, dtype=object),
+        np.asarray(unique_terms, dtype=object),
+        np.asarray(row_to_unique, dtype=np.int64),
+    )
+
+def fuzzy_match_terms_count(normalized_text, precursors_df, threshold=75):
+    # Arrays de termos e autômato pré-computados, cacheados por conteúdo
+    automaton, terms_norm, dims, langs, _, unique_terms, row_to_unique = build_matchers(precursors_df)
+    sentences = _split_sentences(normalized_text)
+    if len(unique_terms) == 0 or not sentences:
+        return pd.DataFrame()
+    # Passada exata: uma varredura Aho-Corasick O(n) no texto inteiro,
+    # contando apenas sobre os termos únicos deduplicados
+    counts = np.zeros(len(unique_terms), dtype=np.int64)
+    for _, idx in automaton.iter(normalized_text):
+        counts[idx] += 1
+    # Apenas termos sem acerto exato seguem para o caminho fuzzy. Não há gate
+    # pelo texto inteiro: partial_ratio só pontua janelas do tamanho do termo,
+    # então uma sentença curta (ou truncada no fim) pode pontuar acima do
+    # score do texto completo e um gate descartaria matches legítimos.
+    pending = np.flatnonzero(counts == 0)
+    if len(pending) > 0 and threshold < 100:
+        # Matriz de scores termo x sentença calculada em lote no pool de threads
+        # C++ do RapidFuzz (workers=-1 usa todos os núcleos e libera a GIL).
+        # Para termos com até 64 caracteres (praticamente todos os precursores),
+        # o partial_ratio interno usa o algoritmo bit-paralelo de Myers em
+        # palavras de 64 bits, então não há ganho em janelar manualmente.
+        scores = process.cdist(
+            list(unique_terms[pending]), sentences,
+            scorer=rfuzz.partial_ratio,
+            score_cutoff=threshold,
+            dtype=np.uint8,
+            workers=-1,
+        )
+        counts[pending] = (scores > 0).sum(axis=1)
+    # Expande as contagens dos termos únicos de volta para as linhas (dim, idioma)
+    row_counts = counts[row_to_unique]
+    results = [
+        {"Precursor": term, "Dimensao": dim, "Idioma": lang, "Frequência": int(count)}
+        for term, dim, lang, count in zip(terms_norm, dims, langs, row_counts)
+        if count > 0
+    ]
     return pd.DataFrame(results)
 
 
@@ -100,10 +240,8 @@ except Exception as e:
 if uploaded_report:
     # Extrai texto
     ext = os.path.splitext(uploaded_report.name)[-1].lower()
-    if ext == ".pdf":
-        text = extract_text_from_pdf(uploaded_report)
-    elif ext == ".docx":
-        text = extract_text_from_docx(uploaded_report)
+    if ext in (".pdf", ".docx"):
+        text, normalized_text = _extract(uploaded_report.getvalue(), ext)
     else:
         st.error("Formato de arquivo não suportado.")
         st.stop()
@@ -122,7 +260,7 @@ if uploaded_report:
 
     # Faz o matching
     st.info("Analisando o relatório, aguarde alguns segundos...")
-    resultado = fuzzy_match_terms_count(text, precursors_df, threshold=threshold)
+    resultado = fuzzy_match_terms_count(normalized_text, precursors_df, threshold=threshold)
 
     if resultado.empty:
         st.warning("⚠️ Nenhum precursor foi identificado no relatório.")
@@ -135,10 +273,8 @@ if uploaded_report:
 
         # Gráfico de barras
         df_freq = resumo.groupby("Dimensao")["Frequência"].sum().reset_index()
-        fig1, ax1 = plt.subplots()
-        sns.barplot(x="Dimensao", y="Frequência", data=df_freq, ax=ax1)
-        ax1.set_title("Frequência de Precursores por Dimensão")
-        st.pyplot(fig1)
+        fig1 = px.bar(df_freq, x="Dimensao", y="Frequência", title="Frequência de Precursores por Dimensão")
+        st.plotly_chart(fig1, use_container_width=True)
 
 
         # Mapa de Árvore (Treemap)
@@ -151,19 +287,19 @@ if uploaded_report:
         fig3 = px.sunburst(resumo, path=["Dimensao", "Precursor"], values="Frequência", title="Distribuição de Precursores por Dimensão")
         st.plotly_chart(fig3, use_container_width=True)
 
-        # Gera planilha Sim/Não (para o idioma detectado)
-        encontrados_norm = set(normalize(p).strip() for p in resultado["Precursor"].unique())
-        status_list = []
-        for _, row in precursors_df.iterrows():
-            for term in str(row[lang_detected]).split(";"):
-                raw_term = term.strip()
-                term_norm = normalize(raw_term)
-                status_list.append({
-                    "Dimensao": row["Dimensao"],
-                    "Precursor": raw_term,
-                    "Encontrado": "Sim" if term_norm in encontrados_norm else "Não"
-                })
-        df_status = pd.DataFrame(status_list)
+        # Gera planilha Sim/Não (para o idioma detectado) em uma única passada
+        # vetorizada: os Precursores do resultado já são os termos normalizados
+        # saídos de build_matchers, então o hit-set dispensa nova normalização
+        encontrados_norm = resultado["Precursor"].unique()
+        _, terms_norm, dims, langs, terms_orig, _, _ = build_matchers(precursors_df)
+        sel = langs == lang_detected
+        encontrado = np.where(np.isin(terms_norm[sel], encontrados_norm), "Sim", "Não")
+        df_status = pd.DataFrame({
+            "Dimensao": dims[sel],
+            "Idioma": lang_detected,
+            "Precursor": terms_orig[sel],
+            "Encontrado": encontrado,
+        })
          
         # ====== Downloads em Excel (.xlsx) ======
         st.markdown("#### 📥 Baixar resultados em Excel")